@@ -5,6 +5,10 @@ import sys
 
 DAMPING = 0.85
 SAMPLES = 10000
+TOLERANCE = 0.000001
+MAX_ITERATIONS = 100
+# Matches the target of every link in an HTML file read as bytes.
+HREF_RE = re.compile(rb"<a\s+(?:[^>]*?)href=\"([^\"]*)\"")
 
 
 def main():
@@ -12,9 +16,17 @@ def main():
     sys.argv is a list of words written in the command line or terminal to run this file.
     len(sys.argv) represents the number of words.
     """
-    if len(sys.argv) != 2:  # If this condition is true, it means the user did not select a directory.
-        sys.exit("Usage: python pagerank.py corpus")  # Exit the file with this message.
+    if len(sys.argv) not in (2, 3):  # If this condition is true, the user did not select a directory, or gave too many words.
+        sys.exit("Usage: python pagerank.py corpus [damping]")  # Exit the file with this message.
     directory = sys.argv[1]  # Store the directory or name.
+    damping = DAMPING
+    if len(sys.argv) == 3:  # An optional damping factor can follow the directory.
+        try:
+            damping = float(sys.argv[2])
+        except ValueError:
+            sys.exit("Damping factor must be a number.")
+        if not 0 <= damping < 1:
+            sys.exit("Damping factor must be at least 0 and less than 1.")
     corpus = crawl(directory)  # Parse a relation into a dictionary variable. Example:
     # {
     #  '1.html': {'2.html'},
@@ -22,14 +34,14 @@ def main():
     #  '3.html': {'2.html', '4.html'},
     #  '4.html': {'2.html'}
     # }
-    ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
+    pages = sorted(corpus)  # Sort the page names once, since both results have the same pages.
+    ranks = sample_pagerank(corpus, damping, SAMPLES)
     print(f"PageRank Results from Sampling (n = {SAMPLES})")
-    for page in sorted(ranks):
-        print(f"  {page}: {ranks[page]:.4f}")  # :.4f to print only 4 places after the floating-point.
-    ranks = iterate_pagerank(corpus, DAMPING)
+    # :.4f to print only 4 places after the floating-point. Join the lines to print them all at once.
+    print("\n".join(f"  {page}: {ranks[page]:.4f}" for page in pages))
+    ranks = iterate_pagerank(corpus, damping)
     print(f"PageRank Results from Iteration")
-    for page in sorted(ranks):
-        print(f"  {page}: {ranks[page]:.4f}")
+    print("\n".join(f"  {page}: {ranks[page]:.4f}" for page in pages))
 
 
 def crawl(directory):
@@ -44,10 +56,10 @@ def crawl(directory):
     for filename in os.listdir(directory):
         if not filename.endswith(".html"):
             continue
-        with open(os.path.join(directory, filename)) as f:
+        with open(os.path.join(directory, filename), "rb") as f:  # Read as bytes to skip decoding the whole file.
             contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
-            pages[filename] = set(links) - {filename}
+            links = HREF_RE.findall(contents)
+            pages[filename] = set(link.decode() for link in links) - {filename}  # Decode only the links.
 
     # Only include links to other pages in the corpus
     for filename in pages:
@@ -59,6 +71,39 @@ def crawl(directory):
     return pages
 
 
+def _index_corpus(corpus):
+    """
+    Give every page in `corpus` an integer id and store its links
+    in compressed sparse row (CSR) form.
+
+    Return a tuple `(pages, indptr, indices)` where `pages[i]` is the name
+    of page `i`, and the ids of the pages linked to by page `i` are
+    `indices[indptr[i]:indptr[i + 1]]`.
+    """
+    pages = list(corpus)  # Page names, ordered by id.
+    page_ids = {page: i for i, page in enumerate(pages)}  # Map each page name to its id.
+    indptr = [0]
+    indices = []
+    for page in pages:
+        indices.extend(page_ids[linked_page] for linked_page in corpus[page])
+        indptr.append(len(indices))  # Links of the next page start here.
+    return pages, indptr, indices
+
+
+def _incoming_links(indptr, indices):
+    """
+    Reverse the links stored in CSR form by `indptr` and `indices`.
+
+    Return a list where item `i` is a tuple of the ids of the pages linking to page `i`.
+    """
+    num_pages = len(indptr) - 1
+    incoming_links = [[] for _ in range(num_pages)]
+    for page in range(num_pages):
+        for linked_page in indices[indptr[page]:indptr[page + 1]]:
+            incoming_links[linked_page].append(page)
+    return [tuple(links) for links in incoming_links]
+
+
 def transition_model(corpus, page, damping_factor):
     """
     Return a probability distribution over which page to visit next,
@@ -72,8 +117,8 @@ def transition_model(corpus, page, damping_factor):
     # Assume linked pages have equal probability to be chosen.
     # For each linked page, the probability = damping_factor / total number of linked pages.
 
-    linked_pages = list(corpus[page])  # Store linked pages in a list.
-    if len(linked_pages) > 0:  # If the list isn't empty.
+    linked_pages = corpus[page]  # Use the set of linked pages directly, so lookups in it are fast.
+    if len(linked_pages) > 0:  # If the set isn't empty.
         # Calculate probability for each page.
         transition_model_dict = {page: damping_factor / len(linked_pages) for page in linked_pages}
     else:
@@ -86,18 +131,17 @@ def transition_model(corpus, page, damping_factor):
     # For each non-linked page, the probability = (1 - damping_factor) / total number of non-linked pages.
     # By using these two equations, the sum of probabilities equals 1.
 
-    # This line stores all non-linked pages in a list.
-    non_linked_pages = [non_linked_page for non_linked_page in corpus.keys() if non_linked_page not in linked_pages]
-    if len(non_linked_pages) > 0:
-        transition_model_dict.update(
-            {page: (1 - damping_factor) / len(non_linked_pages) for page in non_linked_pages})
+    # Count the non-linked pages instead of storing them, since every corpus page is either linked or not.
+    num_non_linked_pages = len(corpus) - len(linked_pages)
+    if num_non_linked_pages > 0:
+        non_linked_probability = (1 - damping_factor) / num_non_linked_pages
+        for non_linked_page in corpus:  # One pass over the corpus, with a set lookup for each page.
+            if non_linked_page not in linked_pages:
+                transition_model_dict[non_linked_page] = non_linked_probability
     else:
-        """
-        Return to calculating linked pages with a new damping_factor = 1
-        Using recursion in this case is the best option.
-        """
-        if damping_factor != 0:
-            transition_model(corpus, page, 1)
+        # The page links to every page in the corpus, so all of the probability goes to linked pages,
+        # which is the same as choosing a page at random from the whole corpus.
+        transition_model_dict = {linked_page: 1 / len(corpus) for linked_page in corpus}
 
     return transition_model_dict
 
@@ -114,72 +158,108 @@ def sample_pagerank(corpus, damping_factor, n):
 
     # Step one:
 
-    # Initialize PageRank values for each page as 0.
-    pagerank = {page: 0 for page in corpus}
+    # Give each page an integer id, and store the ids of its linked pages in CSR form.
+    pages, indptr, indices = _index_corpus(corpus)
 
-    # Simulate `n` random page visits according to the transition model.
-    # `damping_factor`: probability of choosing a linked page.
-    for _ in range(n):
+    # Simulate `n` page visits according to the transition model, starting with a random page.
+    counts = _walk(indptr, indices, damping_factor, n)
 
-        # Choose a random page to start.
-        page = random.choice(list(corpus.keys()))
+    # Step two: Normalize page scores.
+    # The walk made exactly `n` visits, so the visit counts sum to `n`.
+    pages_rank = {page: count / n for page, count in zip(pages, counts)}
+    # Create a PageRank dictionary where values are normalized scores.
+    return pages_rank  # Return the PageRank dictionary.
 
-        while True:
-            # Add a visit to the current page.
-            pagerank[page] += 1
 
-            # Explore other linked pages if a random number is less than the damping factor.
-            # Otherwise, break the loop.
-            if random.random() < damping_factor:
-                linked_pages = corpus[page]
+def _walk(indptr, indices, damping_factor, n):
+    """
+    Walk `n` steps of the random surfer over page ids, starting with a page at random,
+    where the ids linked to by page `i` are `indices[indptr[i]:indptr[i + 1]]`.
 
-                if linked_pages:  # Check if the list isn't empty.
-                    page = random.choice(list(linked_pages))  # Choose a random linked page.
-                else:
-                    page = random.choice(list(corpus.keys()))  # Choose a random page from all pages.
-            else:
-                break
+    Return a list where item `i` is the number of visits to page `i`.
+    """
+    num_pages = len(indptr) - 1
+    # Bind random.random to a local name, since it is looked up on every step.
+    # Random ids are drawn as int(random_float() * count), which skips the argument checks
+    # of random.randrange and is several times faster.
+    random_float = random.random
 
-    # Step two: Normalize page scores.
-    total_score = sum(list(pagerank.values()))  # Calculate the sum of page scores.
-    pages_rank = {page: score / total_score for page, score in pagerank.items()}
-    # Create a PageRank dictionary where values are normalized scores.
-    return pages_rank  # Return the PageRank dictionary.
+    # Initialize the number of visits to each page as 0.
+    counts = [0] * num_pages
+
+    # `damping_factor`: probability of choosing a linked page.
+    page = int(random_float() * num_pages)
+    for _ in range(n):
+        # Add a visit to the current page.
+        counts[page] += 1
+
+        # Move to a random linked page if a random number is less than the damping factor.
+        # Otherwise, or if the page has no links, move to a random page from all pages.
+        start, end = indptr[page], indptr[page + 1]
+        if start != end and random_float() < damping_factor:
+            page = indices[start + int(random_float() * (end - start))]
+        else:
+            page = int(random_float() * num_pages)
+    return counts
 
 
-def iterate_pagerank(corpus, damping_factor):
+def iterate_pagerank(corpus, damping_factor, tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
     """
     Return PageRank values for each page by iteratively updating
-    PageRank values until convergence.
+    PageRank values until convergence, that is, until the total change
+    of all values in one update is less than `tolerance`, or after
+    `max_iterations` updates.
+
+    Each update gives every page (1 - damping_factor) / N for a random jump,
+    plus damping_factor * (total rank of pages without links) / N, since such
+    pages are treated as linking to every page. The total change shrinks by
+    at least a factor of `damping_factor` per update, so convergence takes at
+    most about log(tolerance) / log(damping_factor) updates: 85 for the
+    default 0.85 and 1e-6, and 48 for a damping factor of 0.75.
 
     Return a dictionary where keys are page names, and values are
     their estimated PageRank value (a value between 0 and 1). All
     PageRank values should sum to 1.
     """
+    pages, indptr, indices = _index_corpus(corpus)
+    num_pages = len(pages)
+    # Store the pages linking to each page, so every new rank is a single sum over its incoming links.
+    incoming_links = _incoming_links(indptr, indices)
+    # Pages without links are treated as having one link to every page in the corpus.
+    dangling_pages = [i for i in range(num_pages) if indptr[i] == indptr[i + 1]]
+    # Each linked page gets rank(page) * damping_factor / number of linked pages,
+    # so compute damping_factor / number of linked pages once for every page that has links.
+    link_weights = [
+        damping_factor / (indptr[i + 1] - indptr[i]) if indptr[i] != indptr[i + 1] else 0.0
+        for i in range(num_pages)
+    ]
+
     # Step one:
-    # Calculate ranks using the transition_model.
-    pagerank = {page: 0 for page in corpus.keys()}  # Initialize a dictionary with keys as pages and values as 0.
-    for page in corpus.keys():  # Iterate through all pages in the corpus.
-        transition_model_dict = transition_model(corpus, page, damping_factor)  # Use the transition_model function.
-        for key, value in transition_model_dict.items():  # Iterate through the transition model's output.
-            pagerank[key] += value  # Increment the rank for each page in the linked pages.
+    # Start by assigning each page a rank of 1 / N.
+    ranks = [1 / num_pages] * num_pages
 
     # Step two:
-    # Calculate ranks using previous knowledge, pagerank.
-    # Initialize a dictionary with keys as pages and values as (1 - damping_factor) / len(corpus),
-    # representing the probability of reaching each page.
-    new_pagerank = {page: (1 - damping_factor) / len(corpus) for page in corpus.keys()}
-    for page, linked_pages in corpus.items():  # Iterate through corpus items.
-        for linked_page in linked_pages:  # Iterate through linked pages.
-            new_pagerank[linked_page] += pagerank[page] * damping_factor / len(linked_pages)
-            # Update the PageRank using the equation: pagerank(page) * damping_factor / number of linked pages.
+    # Repeatedly apply the PageRank formula until the ranks stop changing.
+    for _ in range(max_iterations):
+        # Every page gets (1 - damping_factor) / N from a random jump,
+        # plus an equal share of the rank held by pages without links.
+        dangling_rank = sum(ranks[i] for i in dangling_pages)
+        base_rank = (1 - damping_factor) / num_pages + damping_factor * dangling_rank / num_pages
+        # Calculate the rank each page passes along each of its links.
+        shares = [rank * weight for rank, weight in zip(ranks, link_weights)]
+        get_share = shares.__getitem__
+        new_ranks = [base_rank + sum(map(get_share, links)) for links in incoming_links]
+
+        # Stop once the total change of all ranks is less than the tolerance.
+        delta = sum(abs(new_rank - rank) for new_rank, rank in zip(new_ranks, ranks))
+        ranks = new_ranks
+        if delta < tolerance:
+            break
 
     # Step three:
-    # Normalize the pagerank values to be between 0 and 1.
-    total = sum(new_pagerank.values())  # Calculate the total score.
-    new_pagerank = {page: rank / total for page, rank in new_pagerank.items()}  # Divide each score by the total score.
-
-    return new_pagerank
+    # Return the ranks by page name. No normalizing is needed: every update hands out all of the rank,
+    # including that of pages without links, so the ranks still sum to 1.
+    return dict(zip(pages, ranks))
 
 
 if __name__ == "__main__":